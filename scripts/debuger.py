@@ -80,11 +80,11 @@ from gi.repository import GObject
 from gi.repository import Gtk
 from gi.repository import Gdk
 import cairo
+import itertools
 import json
 import math
 import pyinotify
 import threading
-from queue import Queue
 import re
 import sys
 import time
@@ -94,6 +94,7 @@ class LexError(Exception): pass
 
 
 point_re = re.compile(r"^\((-?\d+(\.\d+)?),(-?\d+(\.\d+)?)\)$")
+TWOPI = 2 * math.pi
 
 
 class Logger(object):
@@ -106,24 +107,36 @@ class Logger(object):
 
     """
 
+    # Checks are written as `__debug__ and self.enable`, so that
+    # running with -O compiles logging out of the hot paths entirely.
     enable = False
 
-    def __init__(self, name):
+    def __init__(self, name, buffered=False):
         self.name = name
+        self.buffer = [] if buffered else None
 
     def __call__(self, prefix, *args):
-        """Prints a log message."""
+        """Prints a log message, or buffers it until flush()."""
 
-        if self.enable:
+        if __debug__ and self.enable:
             msg = ("%s %s " %
                (self.name, prefix) +
                 " ".join((repr(arg) for arg in args)))
-            print(msg, file=sys.stderr)
+            if self.buffer is None:
+                print(msg, file=sys.stderr)
+            else:
+                self.buffer.append(msg)
         else:
             return self
 
+    def flush(self):
+        """Write out any buffered messages in a single call."""
+        if self.buffer:
+            print("\n".join(self.buffer), file=sys.stderr)
+            del self.buffer[:]
+
     def trace(self, *args):
-        if self.enable:
+        if __debug__ and self.enable:
             return self.Tracer(self, args)
         else:
             return self
@@ -149,12 +162,28 @@ class Logger(object):
             self.logger("exit:")
 
 
+def null_trace(*unused):
+    """Stands in for a disabled Logger.
+
+    The VM traces on every instruction, and calling a plain function
+    is cheaper than going through Logger.__call__ just to find that
+    logging is off.
+
+    """
+
+    return null_trace
+
+null_trace.enable = False
+
+
 class Point(object):
 
     """Reasonably terse 2D Point class."""
 
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y): self.x = float(x) ; self.y = float(y)
-    def __len__(self):        return math.sqrt(self.x ** 2 + self.y ** 2)
+    def __abs__(self):        return math.hypot(self.x, self.y)
     def __eq__(self, o):
         return isinstance(o, Point) and (self.x, self.y) == (o.x, o.y)
     def __repr__(self):       return "(%g,%g)" % (self.x, self.y)
@@ -162,19 +191,29 @@ class Point(object):
     def __hash__(self):       return hash((self.x, self.y))
     def __bool__(self):       return False
 
-    def binop(func):
-        def impl(self, x):
-            o = x if isinstance(x, Point) else Point(x, x)
-            return Point(func(self.x, o.x), func(self.y, o.y))
-        return impl
+    # Arithmetic is spelled out per operator: these run for every
+    # coordinate the VM computes, so avoid a generic dispatch helper.
+    # Scalar operands apply to both components.
+
+    def __add__(self, o):
+        if o.__class__ is Point: return Point(self.x + o.x, self.y + o.y)
+        return Point(self.x + o, self.y + o)
+
+    def __sub__(self, o):
+        if o.__class__ is Point: return Point(self.x - o.x, self.y - o.y)
+        return Point(self.x - o, self.y - o)
+
+    def __mul__(self, o):
+        if o.__class__ is Point: return Point(self.x * o.x, self.y * o.y)
+        return Point(self.x * o, self.y * o)
+
+    def __truediv__(self, o):
+        if o.__class__ is Point: return Point(self.x / o.x, self.y / o.y)
+        return Point(self.x / o, self.y / o)
 
-    __add__  = binop(lambda a, b: a + b)
-    __sub__  = binop(lambda a, b: a - b)
-    __mul__  = binop(lambda a, b: a * b)
-    __rsub__ = binop(lambda a, b: b - a)
-    __rmul__ = binop(lambda a, b: b * a)
-    __truediv__  = binop(lambda a, b: a / b)
-    __rtruediv__ = binop(lambda a, b: b / a)
+    def __rsub__(self, o):    return Point(o - self.x, o - self.y)
+    def __rmul__(self, o):    return Point(o * self.x, o * self.y)
+    def __rtruediv__(self, o): return Point(o / self.x, o / self.y)
 
 
 
@@ -264,11 +303,21 @@ class VirtualContext(object):
 
 
 def frange(lower, upper, step):
-    """Like xrange, but for floats."""
-    accum = lower
-    while accum < upper:
-        yield accum
-        accum += step
+    """Like range, but for floats.
+
+    Returns lower, lower + step, ... while the value is less than upper,
+    so the range is empty unless lower < upper, in which case step
+    must be positive. Elements are computed from their index rather
+    than by repeated addition.
+    """
+    if upper <= lower:
+        return []
+    count = int(math.ceil((upper - lower) / float(step)))
+    ret = [lower + i * step for i in range(count)]
+    # the rounded count can include one element at or past upper.
+    if ret and ret[-1] >= upper:
+        ret.pop()
+    return ret
 
 
 class VM(object):
@@ -285,15 +334,37 @@ class VM(object):
         "square": cairo.LINE_CAP_SQUARE
     }
 
+    # opcodes which only touch the stack, and never the cairo context.
+    pure = frozenset((
+        "drop", "dup", "rel", "swap", "+", "-", "*", "/", "%", "min",
+        "max", "abs", "sin", "cos", "range", "point", "unpack", "len",
+        "pi", ".", "!"
+    ))
+
     def __init__(self, target, bounds, trace=False):
         self.stack = []
         self.target = target
-        self.trace = Logger("VM:")
-        self.trace.enable = trace
+        if trace:
+            # the VM logs every instruction, so write the log once per
+            # program run rather than once per message.
+            self.trace = Logger("VM:", buffered=True)
+            self.trace.enable = True
+        else:
+            self.trace = null_trace
         self.layout_stack = [bounds]
         self.debug_output = []
         self.locals_ = []
         self.cur_token = None
+        self.volatile = False
+
+        # bind the cairo methods called once per instruction, or once
+        # per path segment, so they aren't looked up on every call.
+        self.get_matrix = target.get_matrix
+        self.move_to = target.move_to
+        self.line_to = target.line_to
+        self.curve_to = target.curve_to
+
+        self.matrix = self.get_matrix()
         self.push(VirtualContext())
 
     def get_local(self, name):
@@ -308,60 +379,132 @@ class VM(object):
         self.locals_[-1][name] = value
 
     def run(self, program, target, env):
+        self.program = program
+        self.env = env
         self.locals_.append({})
-        self.trace("PROG:", program)
-        for token in program[target]:
-            self.execute(token, program, env)
-            token.update_transform(self.target.get_matrix())
+        code = target if isinstance(target, Block) else program[target]
+        # keep tracing out of the untraced loop entirely.
+        if __debug__ and self.trace.enable:
+            self.trace("PROG:", target)
+            depth = len(self.locals_)
+            try:
+                for insn in code:
+                    self.trace("EXEC:", insn[0])
+                    self.execute(insn)
+            finally:
+                if depth == 1:
+                    self.trace.flush()
+        else:
+            for insn in code:
+                self.execute(insn)
         self.locals_.pop()
 
-    def execute(self, token, program, env):
-        self.trace("EXEC:", token)
-        if token == "loop":
-            self.trace("LOOP")
-            body = self.pop()
-            collection = self.pop()
-            for item in collection:
-                self.push(item)
-                self.run(program, body, env)
-        elif token == "define":
-            symbol = self.pop()
-            value = self.pop()
-            if (symbol in self.opcodes
-                or symbol in env
-                or symbol in program
-                or self.get_local(symbol)
-            ):
-                raise VMError("Redefinition of symbol %s" % symbol, token)
-            else:
-                self.set_local(symbol, value)
-        elif token == "call":
-            symbol = self.pop()
-            self.run(program, symbol, env)
-        elif token in self.opcodes:
-            self.trace("OPCD")
-            self.opcodes[token](self)
-        elif token in env:
+    def execute(self, insn):
+        (token, pure, func, args) = insn
+        self.cur_token = token
+        func(self, *args)
+        # stack-only tokens can't change the transform, so don't
+        # bother asking cairo for it.
+        if not pure:
+            self.matrix = self.get_matrix()
+        token.update_transform(self.matrix)
+
+    @classmethod
+    def assemble(cls, token, code):
+        """Resolve a token into an instruction.
+
+        Instructions are (token, pure, func, args) tuples. Executing
+        one calls func(vm, *args), so the meaning of each token is
+        decided once when the program is loaded, rather than every
+        time it is executed.
+
+        References to labels are resolved to the label's body in
+        `code`, which may still be in the process of being assembled.
+
+        """
+
+        if token.literal:
+            return (token, True, cls.push_literal, (token.value,))
+        elif token in cls.special:
+            return (token, False, cls.special[token], ())
+        elif token in cls.opcodes:
+            return (token, token in cls.pure, cls.opcodes[token], ())
+        elif token.value in code:
+            name = token.value
+            return (token, False, cls.push_or_call, (name, code[name]))
+        elif token.startswith(":"):
+            return (token, True, cls.push_literal, (token.source[1:],))
+        else:
+            return (token, True, cls.push_symbol, (token.value,))
+
+    # --- INSTRUCTIONS
+
+    def push_literal(self, value):
+        self.trace("PUSH")
+        self.push(value)
+
+    def push_symbol(self, name):
+        if name in self.env:
             self.trace("ENV")
-            self.push(env[token])
-        elif token in program:
+            self.push(self.env[name])
+        elif not self.get_local(name):
+            self.trace("PUSH")
+            self.push(name)
+
+    def push_or_call(self, name, body):
+        if name in self.env:
+            self.trace("ENV")
+            self.push(self.env[name])
+        else:
             self.trace("FUNC")
-            self.run(program, token, env)
-        elif isinstance(token, str) and token.startswith(":"):
-            self.push(token[1:].value)
+            self.run(self.program, body, self.env)
+
+    def loop(self):
+        self.trace("LOOP")
+        body = self.pop()
+        collection = self.pop()
+        # body is already assembled; each pass still goes through run()
+        # so that it gets a fresh local scope.
+        run = self.run
+        program = self.program
+        env = self.env
+        for item in collection:
+            self.push(item)
+            run(program, body, env)
+
+    def define(self):
+        symbol = self.pop()
+        value = self.pop()
+        if (symbol in self.opcodes
+            or symbol in self.env
+            or symbol in self.program
+            or self.get_local(symbol)
+        ):
+            raise VMError("Redefinition of symbol %s" % symbol, self.cur_token)
         else:
-            if not self.get_local(token):
-                self.trace("PUSH")
-                self.push(token.value)
+            self.set_local(symbol, value)
+
+    def call(self):
+        symbol = self.pop()
+        self.run(self.program, symbol, self.env)
+
+    special = {
+        "loop":   loop,
+        "define": define,
+        "call":   call
+    }
 
     def push(self, val):
         self.stack.append(val)
 
     def peek(self, index=0):
+        # rel takes its index from the program, so it can be anything.
+        if type(index) is not int or not 0 <= index < len(self.stack):
+            raise VMError("Stack underflow", self.cur_token)
         return self.stack[-(index + 1)]
 
     def poke(self, value, index=0):
-        self.stack[index] = value
+        self.stack[-(index + 1)] = value
 
     def pop(self):
         if self.stack:
@@ -413,7 +556,9 @@ class VM(object):
         step = self.pop()
         upper = self.pop()
         lower = self.pop()
-        self.push(list(frange(lower, upper, step)))
+        if lower < upper and step <= 0:
+            raise VMError("Range step must be positive", self.cur_token)
+        self.push(frange(lower, upper, step))
 
     def point(self):
         y = self.pop()
@@ -426,7 +571,11 @@ class VM(object):
         self.push(pt.x)
 
     def len(self):
-        self.push(len(self.pop()))
+        value = self.pop()
+        if isinstance(value, Point):
+            self.push(abs(value))
+        else:
+            self.push(len(value))
 
     def rgb(self):
         b = self.pop()
@@ -446,7 +595,7 @@ class VM(object):
     def circle(self):
         radius = self.pop()
         self.maybe_start_path()
-        self.target.arc(0, 0, radius, 0, 2 * math.pi)
+        self.target.arc(0, 0, radius, 0, TWOPI)
 
     def arc(self):
         end = self.pop()
@@ -495,19 +644,19 @@ class VM(object):
     def moveto(self):
         (x, y) = self.pop()
         self.maybe_start_path()
-        self.target.move_to(x, y)
+        self.move_to(x, y)
 
     def lineto(self):
         (x, y) = self.pop()
         self.maybe_start_path()
-        self.target.line_to(x, y)
+        self.line_to(x, y)
 
     def curveto(self):
         (x3, y3) = self.pop()
         (x2, y2) = self.pop()
         (x1, y1) = self.pop()
         self.require(self.peek(0), VirtualPath)
-        self.target.curve_to(x1, y1, x2, y2, x3, y3)
+        self.curve_to(x1, y1, x2, y2, x3, y3)
 
     def close(self):
         self.require(self.peek(0), VirtualPath)
@@ -649,9 +798,10 @@ class VM(object):
         self.push(math.cos(self.pop()))
 
     def abs(self):
-        self.push(math.abs(self.pop()))
+        self.push(abs(self.pop()))
 
     def time(self):
+        self.volatile = True
         self.push(time.time())
 
     def pi(self):
@@ -746,7 +896,8 @@ class Analyzer(VM):
         VM.run(self, program, target, env)
         self.cur_token = self.token_stack.pop()
 
-    def execute(self, token, program, env):
+    def execute(self, insn):
+        token = insn[0]
         if token == 'save':
             self.save_count += 1
         elif token == 'restore':
@@ -754,7 +905,7 @@ class Analyzer(VM):
         self.cur_token = token
         if token not in self.token_args:
             self.token_args[id(token)] = []
-        VM.execute(self, token, program, env)
+        VM.execute(self, insn)
 
     def push(self, value):
         self.shadow_stack.append(self.cur_token)
@@ -767,12 +918,13 @@ class Analyzer(VM):
         return ret
 
     def peek(self, pos):
+        ret = VM.peek(self, pos)
         index = -(pos + 1)
         source = self.shadow_stack[index]
         if source is not None:
             self.shadow_stack[index] = self.cur_token
             self.token_args[id(self.cur_token)].append(source)
-        return VM.peek(self, pos)
+        return ret
 
     def trace_insn(self, token):
         ret = []
@@ -795,6 +947,7 @@ class Token(object):
     def __init__(self, source, line, index):
         self.source = source
         self.value = self.parse(source)
+        self.literal = isinstance(self.value, (int, float))
         self.line = line
         self.index = index
         self.transform = None
@@ -813,6 +966,7 @@ class Token(object):
 
     def update(self, value):
         self.value = value
+        self.literal = isinstance(value, (int, float))
         self.source = str(value)
 
     def __hash__(self):
@@ -822,11 +976,27 @@ class Token(object):
     def parse(cls, token):
         try:
             return int(token)
-        except:
-            try:
-                return float(token)
-            except:
-                return token
+        except ValueError:
+            pass
+        try:
+            return float(token)
+        except ValueError:
+            return token
+
+
+class Block(list):
+
+    """The instructions of a [ ... ] block, as pushed onto the stack.
+
+    Shows the source of its tokens rather than the instruction tuples,
+    both in the UI and in traces.
+
+    """
+
+    def __repr__(self):
+        return "[%s]" % " ".join(
+            repr(insn[3][0]) if insn[0] == "[" else insn[0].source
+            for insn in self)
 
 
 def compile(source):
@@ -852,16 +1022,35 @@ def compile(source):
             else:
                 cur_label = labels[label] = []
         elif token == "[":
-            lists.append([])
+            lists.append((token, []))
         elif token == "]":
-            cur_label.append(lists.pop())
+            (start, body) = lists.pop()
+            if lists:
+                lists[-1][1].append((start, body))
+            else:
+                cur_label.append((start, body))
         else:
             if lists:
-                lists[-1].append(token)
+                lists[-1][1].append(token)
             else:
                 cur_label.append(token)
 
-    return lines, tokens, labels
+    # create every body up front, so that calls can refer to bodies
+    # which haven't been assembled yet.
+    code = {label: Block() for label in labels}
+
+    def assemble(item):
+        if isinstance(item, tuple):
+            (start, body) = item
+            block = Block(assemble(token) for token in body)
+            return (start, True, VM.push_literal, (block,))
+        else:
+            return VM.assemble(item, code)
+
+    for label, body in labels.items():
+        code[label].extend(assemble(item) for item in body)
+
+    return lines, tokens, code
 
 
 class Save(object):
@@ -897,6 +1086,75 @@ class Subdivide(object):
         self.cr.restore()
 
 
+class Recording(object):
+
+    """The output of a single VM run, which can be replayed onto later frames.
+
+    The VM draws into a recording surface rather than the window, so
+    that frames in which neither the program, the environment, nor
+    the geometry has changed can skip re-executing the program.
+
+    """
+
+    def __init__(self, cr, prog, env, key, bounds):
+        self.prog = prog
+        self.env = env
+        self.key = key
+        self.surface = cairo.RecordingSurface(cairo.CONTENT_COLOR_ALPHA, None)
+        target = cairo.Context(self.surface)
+
+        # start from the same drawing state the program would have had
+        # drawing on cr directly.
+        target.set_matrix(cr.get_matrix())
+        target.set_source(cr.get_source())
+        target.set_line_width(cr.get_line_width())
+
+        # create a new vm instance with the recording as the target.
+        self.error = None
+        self.vm = Analyzer(target, bounds, False)
+        try:
+            self.vm.run(prog, 'main', env)
+        except VMError as e:
+            self.error = e
+
+        for _ in range(self.vm.save_count):
+            target.restore()
+
+        self.matrix = target.get_matrix()
+        self.path = target.copy_path()
+
+        # sort out what was left on the stack once, rather than on
+        # every frame the recording is replayed: the residual points,
+        # and the top two numbers.
+        self.points = []
+        self.numbers = []
+        for item in reversed(self.vm.stack):
+            kind = type(item)
+            if kind is Point:
+                self.points.append(item)
+            elif (kind is int or kind is float) and len(self.numbers) < 2:
+                self.numbers.append(item)
+
+    def current(self, prog, env):
+        """True if the program and environment haven't changed."""
+        return (prog is self.prog
+                and env is self.env
+                and not self.vm.volatile)
+
+    def valid(self, prog, env, key):
+        """True if this recording is still the output for the given input."""
+        return key == self.key and self.current(prog, env)
+
+    def replay(self, cr):
+        """Paint the recording, and restore the final transform and path."""
+        with Save(cr):
+            cr.identity_matrix()
+            cr.set_source_surface(self.surface, 0, 0)
+            cr.paint()
+        cr.set_matrix(self.matrix)
+        cr.append_path(self.path)
+
+
 class EditorState(object):
 
     def __init__(self, path):
@@ -907,7 +1165,9 @@ class EditorState(object):
         self.cursor = (0, 0)
 
     def load(self):
-        self.source, self.token_map, self.prog = compile(open(self.path, "r"))
+        with open(self.path, "r") as f:
+            lines = f.read().splitlines()
+        self.source, self.token_map, self.prog = compile(lines)
 
     def left(self):
         x, y = self.cursor
@@ -926,9 +1186,10 @@ class EditorState(object):
         self.set_cursor(x, y + 1)
 
     def set_cursor(self, x, y):
-        ymax = len(self.source) - 1
-        xmax = len(self.source[y]) - 1
-        self.cursor = (max(0, min(xmax, x)), max(0, min(ymax, y)))
+        # clamp the row first, since it determines the column limit.
+        y = max(0, min(len(self.source) - 1, y))
+        xmax = len(self.source[y]) - 1 if self.source else 0
+        self.cursor = (max(0, min(xmax, x)), y)
 
     def cur_insn(self):
         return self.token_map[self.cursor]
@@ -941,17 +1202,38 @@ class Editor(object):
     vm_gutter_width = 125.5
     code_gutter_width = 350.5
     token_length = 55.0
+    extents_cache_size = 128
 
     def __init__(self, reader):
         self.state = EditorState(sys.argv[1])
         self.allowable = []
         self.transform = None
+        self.recording = None
+        self.layout_cache = None
+        self.extents_cache = {}
+        self.dirty = True
         self.reader = reader
         self.reader.start()
 
+    def extents(self, cr, text):
+        """Return the (width, height) of text, caching the result.
+
+        The font never changes, so the extents of a given string are
+        the same on every frame.
+
+        """
+
+        ret = self.extents_cache.get(text)
+        if ret is None:
+            if len(self.extents_cache) >= self.extents_cache_size:
+                self.extents_cache.clear()
+            _, _, tw, th, _, _ = cr.text_extents(text)
+            ret = self.extents_cache[text] = (tw, th)
+        return ret
+
     def text(self, cr, text):
         """Draw text centered at (0, 0)"""
-        _, _, tw, th, _, _ = cr.text_extents(text)
+        tw, th = self.extents(cr, text)
         with Save(cr):
             cr.move_to(-tw / 2, th / 2)
             cr.show_text(text)
@@ -964,7 +1246,6 @@ class Editor(object):
             cr.rectangle(x, y, rect.width, rect.height)
 
     def token(self, cr, token, fill=True):
-        _, _, tw, _, _, _ = cr.text_extents(token)
         th = 10
         rect = Rect(Point(0, 0), self.code_gutter_width - 5.0, th + 5.0)
         with Save(cr):
@@ -978,46 +1259,90 @@ class Editor(object):
             self.text(cr, token)
         return (rect.width, rect.height)
 
-    def run(self, cr, origin, scale, window_size):
-        self.trace("run:", self.state)
+    def layout(self, window_size):
+        """Split the window into the regions of the UI.
+
+        The result only depends on the window size, so it is computed
+        once and re-used until the window is resized.
+
+        """
+
+        key = (window_size.x, window_size.y)
+
+        if self.layout_cache is None or self.layout_cache[0] != key:
+            window = Rect.from_top_left(Point(0, 0), window_size.x, window_size.y)
+
+            (remainder, status_bar) = window\
+                .split_horizontal(window.height - self.status_bar_height)
+
+            (remainder, vm_gutter) = remainder\
+                .split_vertical(window.width - self.vm_gutter_width)
+
+            (code_gutter, content) = remainder\
+                .split_vertical(self.code_gutter_width)
+
+            self.layout_cache = (
+                key,
+                (window, status_bar, vm_gutter, code_gutter, content)
+            )
+
+        return self.layout_cache[1]
 
-        window = Rect.from_top_left(Point(0, 0), window_size.x, window_size.y)
+    def stale(self):
+        """True if the last frame drawn no longer reflects the editor.
 
-        (remainder, status_bar) = window\
-            .split_horizontal(window.height - self.status_bar_height)
+        Geometry and scale are only known while drawing, so changes to
+        those queue their own redraw; this only needs to account for
+        input, the program, and the environment.
 
-        (remainder, vm_gutter) = remainder\
-            .split_vertical(window.width - self.vm_gutter_width)
+        """
 
-        (code_gutter, content) = remainder\
-            .split_vertical(self.code_gutter_width)
+        return (self.dirty
+                or self.recording is None
+                or not self.recording.current(self.state.prog,
+                                              self.reader.env))
+
+    def run(self, cr, origin, scale, window_size):
+        self.trace("run:", self.state)
+        self.dirty = False
+
+        layout = self.layout(window_size)
+        env = self.reader.env
 
         # set default context state
         cr.set_source_rgb(0, 0, 0)
         cr.set_line_width(1.0)
 
+        self.draw_program(cr, layout, scale, env)
+        self.draw_ui(cr, layout, env)
+
+    def draw_program(self, cr, layout, scale, env):
+        """Draw the program output, and feedback on its final state.
+
+        The program itself is only re-run when its recording is stale.
+
+        """
+
+        (window, status_bar, vm_gutter, code_gutter, content) = layout
         bounds = Rect(Point(0, 0), content.width / scale.x, content.height / scale.y)
+        key = (content.width, content.height, scale.x, scale.y)
 
         with Subdivide(cr, content):
             cr.scale(scale.x, scale.y)
 
-            # create a new vm instance with the window as the target.
-            try:
-                error = None
-                vm = Analyzer(cr, bounds, False)
-                vm.run(self.state.prog, 'main', self.reader.env)
-            except VMError as e:
-                error = e
-
-            for _ in range(vm.save_count):
-                cr.restore()
+            # only re-run the program if its output could have changed.
+            if (self.recording is None
+                or not self.recording.valid(self.state.prog, env, key)):
+                self.recording = Recording(cr, self.state.prog, env, key, bounds)
 
+            self.recording.replay(cr)
             self.transform = cr.get_matrix()
-            self.inverse_transform = cr.get_matrix()
-            self.inverse_transform.invert()
 
-            # save the current point
-            x, y = cr.get_current_point()
+            # save the current point, if there is one.
+            if cr.has_current_point():
+                current_point = cr.get_current_point()
+            else:
+                current_point = None
 
         with Save(cr):
             # stroke any residual path for feedback
@@ -1026,52 +1351,53 @@ class Editor(object):
             cr.set_line_width(0.1)
             cr.stroke()
 
-        with Save(cr):
-            # draw the current point.
-            x, y = self.transform.transform_point(x, y)
-            cr.translate(x, y)
-            cr.move_to(-5, 0)
-            cr.line_to(5, 0)
-            cr.move_to(0, -5)
-            cr.line_to(0, 5)
-            cr.stroke()
-
-            # show any residual points on stack
-            for item in vm.stack:
-                if isinstance(item, Point):
-                    (x, y) = self.transform.transform_point(item.x, item.y)
-                    cr.arc(x, y, 0.5, 0, math.pi * 2)
-                    cr.fill()
-
-            # draw top two numbers on stack
-            stack_nums = [
-                i for i in reversed(vm.stack)
-                if (isinstance(i, int) or isinstance(i, float))
-            ] if vm.stack else []
-
-            if len(stack_nums) == 1:
-                cr.arc(0, 0, 0, math.pi * 2, stack_nums[0])
-                cr.stroke()
-            elif len(stack_nums) == 2:
-                # XXX: fixme 
-                # cr.move_to(-width / 2, stack_nums[0])
-                # cr.line_to(width / 2,  stack_nums[0])
-                # cr.stroke()
-                # cr.move_to(stack_nums[1], -height / 2)
-                # cr.line_to(stack_nums[1],  height / 2)
-                # cr.stroke()
-                pass
-
-        # draw gutters around UI
-        with Save(cr):
-            cr.set_line_width(1.0)
-            cr.move_to(*code_gutter.southwest())
-            cr.rel_line_to(window.width, 0)
-            cr.move_to(*vm_gutter.northwest())
-            cr.line_to(*vm_gutter.southwest())
-            cr.move_to(*code_gutter.southeast())
-            cr.rel_line_to(0, -code_gutter.height)
+        # draw the current point, and the gutters around the UI, as
+        # a single path, in the default state set up by run().
+        if current_point is None:
+            x, y = self.transform.transform_point(0, 0)
+        else:
+            x, y = self.transform.transform_point(*current_point)
+            cr.move_to(x - 5, y)
+            cr.line_to(x + 5, y)
+            cr.move_to(x, y - 5)
+            cr.line_to(x, y + 5)
+        cr.move_to(*code_gutter.southwest())
+        cr.rel_line_to(window.width, 0)
+        cr.move_to(*vm_gutter.northwest())
+        cr.line_to(*vm_gutter.southwest())
+        cr.move_to(*code_gutter.southeast())
+        cr.rel_line_to(0, -code_gutter.height)
+        cr.stroke()
+
+        # show any residual points on stack
+        for item in self.recording.points:
+            (px, py) = self.transform.transform_point(item.x, item.y)
+            cr.new_sub_path()
+            cr.arc(px, py, 0.5, 0, TWOPI)
+        cr.fill()
+
+        stack_nums = self.recording.numbers
+
+        # draw top two numbers on stack
+        if len(stack_nums) == 1:
+            cr.arc(x, y, 0, TWOPI, stack_nums[0])
             cr.stroke()
+        elif len(stack_nums) == 2:
+            # XXX: fixme 
+            # cr.move_to(-width / 2, stack_nums[0])
+            # cr.line_to(width / 2,  stack_nums[0])
+            # cr.stroke()
+            # cr.move_to(stack_nums[1], -height / 2)
+            # cr.line_to(stack_nums[1],  height / 2)
+            # cr.stroke()
+            pass
+
+    def draw_ui(self, cr, layout, env):
+        """Draw the source and VM state around the content."""
+
+        (window, status_bar, vm_gutter, code_gutter, content) = layout
+        vm = self.recording.vm
+        error = self.recording.error
 
         # # draw the visible region of the bytecode.
         with Subdivide(cr, code_gutter) as bounds:
@@ -1099,8 +1425,11 @@ class Editor(object):
                     pass
 
 
-            for row, line in enumerate(self.state.source):
-                for col, token in enumerate(line):
+            # only draw the part of the source that fits in the gutter.
+            rows = int(bounds.height / 10) + 1
+            cols = int(bounds.width / 50) + 1
+            for row, line in enumerate(itertools.islice(self.state.source, rows)):
+                for col, token in enumerate(itertools.islice(line, cols)):
                     cr.move_to(col * 50, row * 10)
                     cr.show_text(token)
 
@@ -1138,15 +1467,14 @@ class Editor(object):
 
         with Subdivide(cr, vm_gutter) as bounds:
             cr.translate(*bounds.northwest() + Point(0, 10))
-            for item in sorted(self.reader.env):
+            for item in sorted(env):
                 cr.move_to(0, 0)
-                cr.show_text("%s: %r" % (item, self.reader.env[item]))
+                cr.show_text("%s: %r" % (item, env[item]))
                 cr.translate(0, 10)
 
         with Subdivide(cr, content) as bounds:
             # show the current vm error, if any
             if error is not None:
-                _, _, tw, _, _, _ = cr.text_extents(repr(error))
                 cr.move_to(*bounds.southwest() + Point(5, -10))
                 cr.show_text(error.args[0])
 
@@ -1155,16 +1483,19 @@ class Editor(object):
             cr.show_text(repr(vm.debug_output))
 
 
+    key_actions = {
+        Gdk.KEY_Left:  EditorState.left,
+        Gdk.KEY_Right: EditorState.right,
+        Gdk.KEY_Up:    EditorState.up,
+        Gdk.KEY_Down:  EditorState.down
+    }
+
     def handle_key_event(self, event):
         self.trace("handle_key_event:", self.state)
-        if event.keyval == Gdk.KEY_Left:
-            self.state.left()
-        elif event.keyval == Gdk.KEY_Right:
-            self.state.right()
-        elif event.keyval == Gdk.KEY_Up:
-            self.state.up()
-        elif event.keyval == Gdk.KEY_Down:
-            self.state.down()
+        action = self.key_actions.get(event.keyval)
+        if action is not None:
+            action(self.state)
+            self.dirty = True
 
     def handle_button_press(self, event):
         pass
@@ -1203,12 +1534,25 @@ def gui():
         size = Point(float(geom.width), float(geom.height))
         return size / mm
 
+    # querying the monitor is a round trip to the display server, so
+    # only do it again when the window may have changed monitors.
+    scale = None
+
+    def invalidate_dpi(*unused):
+        nonlocal scale
+        scale = None
+        da.queue_draw()
+        return False
+
     def draw(widget, cr):
+        nonlocal scale
+
         # get window / screen geometry
         alloc = widget.get_allocation()
         screen = Point(float(alloc.width), float(alloc.height))
         origin = screen * 0.5
-        scale = dpi(widget)
+        if scale is None:
+            scale = dpi(widget)
 
         # excute the program
         editor.run(cr, origin, scale, screen)
@@ -1221,7 +1565,8 @@ def gui():
 
     def update():
         try:
-            da.queue_draw()
+            if editor.stale():
+                da.queue_draw()
         finally:
             return True
 
@@ -1238,13 +1583,12 @@ def gui():
     window.add(da)
     window.show_all()
     window.connect("destroy", Gtk.main_quit)
+    window.connect("configure-event", invalidate_dpi)
+    window.get_screen().connect("monitors-changed", invalidate_dpi)
     da.connect('draw', draw)
     window.connect('key-press-event', key_press)
     window.connect('button-press-event', button_press)
     Gtk.main()
 
 if __name__ == "__main__":
-    import traceback
-    print("GUI")
-    Logger.enable = False
     gui()
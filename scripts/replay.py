@@ -1,4 +1,4 @@
-#! /usr/bin/python
+#! /usr/bin/python3
 
 """
 replay.py
@@ -21,30 +21,46 @@ args = docopt(__doc__)
 try:
     path = args['<file>']
 except BaseException:
-    print "No input file given."
+    print("No input file given.")
     exit(-1)
 
 try:
     data = open(path, "r")
 except BaseException:
-    print "Couldn't open %s!" % path
+    print("Couldn't open %s!" % path)
     exit(-1)
 
 data_iter = data
 try:
     if args['--repeat']:
-        print >> sys.stderr, "Looping forever."
+        print("Looping forever.", file=sys.stderr)
         data_iter = itertools.cycle(data)
 except BaseException:
-    print >> sys.stderr, "Single Iteration."
+    print("Single Iteration.", file=sys.stderr)
 
 try:
     delay = float(args['--delay'])
-    print >> sys.stderr, "Delay: %r" % delay
+    print("Delay: %r" % delay, file=sys.stderr)
 except BaseException:
-    print >> sys.stderr, "Using default delay."
+    print("Using default delay.", file=sys.stderr)
+    delay = 0.025
 
+# Pace output against a schedule of one line per delay. When we fall
+# behind it (e.g. at very small delays), lines accumulate and go out
+# in a single write, rather than a write, flush and sleep per line.
+max_chunk = 1024
+chunk = []
+deadline = time.monotonic()
 for line in data_iter:
-    sys.stdout.write(line)
-    sys.stdout.flush()
-    time.sleep(delay)
+    chunk.append(line)
+    deadline += delay
+    now = time.monotonic()
+    if now < deadline or len(chunk) >= max_chunk:
+        sys.stdout.write("".join(chunk))
+        sys.stdout.flush()
+        del chunk[:]
+        if now < deadline:
+            time.sleep(deadline - now)
+
+sys.stdout.write("".join(chunk))
+sys.stdout.flush()
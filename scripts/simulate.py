@@ -1,4 +1,4 @@
-#! /usr/bin/python
+#! /usr/bin/python3
 
 """
 simulate.py
@@ -44,28 +44,28 @@ def parse_rand(argv):
     name = argv[0]
     lower = float(argv[1])
     upper = float(argv[2])
-    return ((name, lambda x: random.randrange(lower, upper)), argv[3:])
+    return ((name, lambda x: random.uniform(lower, upper)), argv[3:])
+
+parsers = {
+    "--identity": parse_identity,
+    "--sin":      parse_sin,
+    "--const":    parse_const,
+    "--rand":     parse_rand,
+}
 
 def parse_channels(argv):
     channels = {}
     while argv:
         token = argv[0]
+        parser = parsers.get(token)
 
-        if token == "--identity":
-            channel = parse_identity(argv[1:])
-        elif token == "--sin":
-            channel = parse_sin(argv[1:])
-        elif token == "--const":
-            channel = parse_const(argv[1:])
-        elif token == "--rand":
-            channel = parse_rand(argv[1:])
-        else:
+        if parser is None:
             raise SyntaxError(
                 "Unexpected token " + repr(token) +
-                "Expected one of --identity, --sin, --const, --rand"
+                ". Expected one of " + ", ".join(parsers)
             )
 
-        ((name, func), argv) = channel
+        ((name, func), argv) = parser(argv[1:])
         channels[name] = func
 
     return channels
@@ -78,15 +78,22 @@ def parse_args(argv):
 
 try:
     delay, channels = parse_args(sys.argv[1:])
-except BaseException, e:
-    print __doc__
+except BaseException:
+    print(__doc__)
     exit(-1)
 
 
+# the set of channels is fixed, so build the output line's template
+# once and only encode the values on each tick.
+names = sorted(channels)
+funcs = tuple(channels[name] for name in names)
+template = "{%s}\n" % ", ".join(
+    "%s: %%s" % json.dumps(name).replace("%", "%%") for name in names
+)
+
 start = time.time()
 while True:
     t = time.time() - start
-    sys.stdout.write(json.dumps({k: channels[k](t) for k in sorted(channels)}))
-    sys.stdout.write('\n')
+    sys.stdout.write(template % tuple(json.dumps(func(t)) for func in funcs))
     sys.stdout.flush()
     time.sleep(delay)